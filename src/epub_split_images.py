@@ -15,49 +15,61 @@ Usage:
   python epub_split_images.py -i /in -o /out --min-width 2 --min-height 2
 
 Benötigt:
-  pip install lxml beautifulsoup4 Pillow
+  pip install lxml Pillow
 """
 
 import argparse
+import copy
+import functools
+import hashlib
 import os
+import posixpath
 import re
 import shutil
-import tempfile
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from uuid import uuid4
+from xml.sax.saxutils import escape, quoteattr
 
-import warnings
-from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
 from lxml import etree
+from lxml import html as lhtml
 from PIL import Image, UnidentifiedImageError
 
-warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
-
 OPF_NS = "http://www.idpf.org/2007/opf"
 DC_NS = "http://purl.org/dc/elements/1.1/"
 CONTAINER_NS = "urn:oasis:names:tc:opendocument:xmlns:container"
 NCX_NS = "http://www.daisy.org/z3986/2005/ncx/"
 
-def unzip_epub(epub_path: Path, out_dir: Path):
-    with zipfile.ZipFile(epub_path, 'r') as zf:
-        zf.extractall(out_dir)
+# Kein xml:id-Hashtable (wird nie abgefragt), keine Entities/Netzzugriffe
+# (härtet nebenbei gegen XXE)
+_OPF_PARSER = etree.XMLParser(collect_ids=False, resolve_entities=False, no_network=True)
+
+def open_epub(epub_path: Path) -> zipfile.ZipFile:
+    """EPUB als ZipFile öffnen – Mitglieder werden bei Bedarf gelesen,
+    ein komplettes Entpacken entfällt."""
+    return zipfile.ZipFile(epub_path, "r")
 
-def find_opf(root_dir: Path) -> Path:
-    container_xml = root_dir / "META-INF" / "container.xml"
-    if not container_xml.exists():
+def zip_entries(zf: zipfile.ZipFile) -> dict:
+    """Normalisierter interner Pfad -> ZipInfo."""
+    return {posixpath.normpath(info.filename): info
+            for info in zf.infolist() if not info.is_dir()}
+
+def find_opf(zf: zipfile.ZipFile) -> str:
+    try:
+        data = zf.read("META-INF/container.xml")
+    except KeyError:
         raise RuntimeError("META-INF/container.xml nicht gefunden")
-    tree = etree.parse(str(container_xml))
+    root = etree.fromstring(data, _OPF_PARSER)
     ns = {"c": CONTAINER_NS}
-    el = tree.find(".//c:rootfile", namespaces=ns)
+    el = root.find(".//c:rootfile", namespaces=ns)
     if el is None or "full-path" not in el.attrib:
         raise RuntimeError("OPF-Pfad in container.xml fehlt")
-    return (root_dir / el.attrib["full-path"]).resolve()
+    return posixpath.normpath(el.attrib["full-path"])
 
-def parse_opf(opf_path: Path):
-    tree = etree.parse(str(opf_path))
+def parse_opf(zf: zipfile.ZipFile, opf_name: str):
     ns = {"opf": OPF_NS, "dc": DC_NS}
-    pkg = tree.getroot()
+    pkg = etree.fromstring(zf.read(opf_name), _OPF_PARSER)
 
     metadata = pkg.find("opf:metadata", ns)
     manifest = pkg.find("opf:manifest", ns)
@@ -89,23 +101,77 @@ def parse_opf(opf_path: Path):
     spine_hrefs = [items_by_id[sid]["href"] for sid in spine_ids if sid in items_by_id]
     return md, items_by_id, items_by_href, spine_hrefs
 
+_MIME = {
+    ".xhtml": "application/xhtml+xml",
+    ".html": "application/xhtml+xml",
+    ".htm": "application/xhtml+xml",
+    ".css": "text/css",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".svg": "image/svg+xml",
+    ".ttf": "font/ttf",
+    ".otf": "font/otf",
+    ".woff": "font/woff",
+    ".woff2": "font/woff2",
+}
+
 def guess_mime(path: Path) -> str:
-    ext = path.suffix.lower()
-    if ext in [".xhtml", ".html", ".htm"]: return "application/xhtml+xml"
-    if ext == ".css": return "text/css"
-    if ext in [".jpg", ".jpeg"]: return "image/jpeg"
-    if ext == ".png": return "image/png"
-    if ext == ".gif": return "image/gif"
-    if ext == ".svg": return "image/svg+xml"
-    if ext == ".ttf": return "font/ttf"
-    if ext == ".otf": return "font/otf"
-    if ext == ".woff": return "font/woff"
-    if ext == ".woff2": return "font/woff2"
-    return "application/octet-stream"
+    return _MIME.get(path.suffix.lower(), "application/octet-stream")
+
+# Bereits komprimierte Formate: erneutes Deflate kostet nur CPU
+_STORED_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".woff", ".woff2"}
+
+def _zip_compress_type(name: str) -> int:
+    ext = Path(name).suffix.lower()
+    return zipfile.ZIP_STORED if ext in _STORED_EXTS else zipfile.ZIP_DEFLATED
+
+def _write_entry(z: zipfile.ZipFile, rel: str, data):
+    """Eintrag mit passender Kompression ins Output-ZIP schreiben."""
+    z.writestr(rel, data, compress_type=_zip_compress_type(rel), compresslevel=6)
+
+def _copy_member(src_zf: zipfile.ZipFile, info: zipfile.ZipInfo,
+                 dst_zf: zipfile.ZipFile, rel: str):
+    """ZIP-Eintrag gepuffert ins Ziel-Archiv streamen statt komplett in den
+    Speicher zu lesen."""
+    zi = zipfile.ZipInfo(rel)
+    zi.compress_type = _zip_compress_type(rel)
+    with src_zf.open(info) as s, dst_zf.open(zi, "w") as d:
+        shutil.copyfileobj(s, d, 1 << 20)
+
+def _read_dims(head: bytes):
+    """Bildmaße direkt aus dem Dateikopf lesen (PNG/JPEG/GIF).
+
+    Für den Platzhalter-Check reicht der Header – das ist um Größenordnungen
+    billiger als ein Pillow-Decode. Liefert (w, h) oder None, wenn das Format
+    nicht erkannt wird.
+    """
+    # PNG: IHDR direkt nach der Signatur, Breite/Höhe als Big-Endian u32
+    if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+        return int.from_bytes(head[16:20], "big"), int.from_bytes(head[20:24], "big")
+    # GIF: Logical Screen Descriptor, Little-Endian u16 ab Offset 6
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return int.from_bytes(head[6:8], "little"), int.from_bytes(head[8:10], "little")
+    # JPEG: Segmente bis zum SOF-Marker abklappern
+    if head[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(head):
+            if head[i] != 0xFF:
+                break
+            marker = head[i + 1]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                h = int.from_bytes(head[i + 5:i + 7], "big")
+                w = int.from_bytes(head[i + 7:i + 9], "big")
+                return w, h
+            i += 2 + int.from_bytes(head[i + 2:i + 4], "big")
+    return None
+
+_SLUG_WS = re.compile(r"\s+")
+_SLUG_BAD = re.compile(r"[^A-Za-z0-9_\-\.]")
 
 def slugify(text: str) -> str:
-    text = re.sub(r"\s+", "-", text.strip())
-    return re.sub(r"[^A-Za-z0-9_\-\.]", "", text) or "untitled"
+    return _SLUG_BAD.sub("", _SLUG_WS.sub("-", text.strip())) or "untitled"
 
 PAGE_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
 <html xmlns="http://www.w3.org/1999/xhtml">
@@ -138,8 +204,8 @@ TEXT_PAGE_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
 """
 
 def build_new_epub(
-    temp_src: Path,
-    opf_path: Path,
+    zf: zipfile.ZipFile,
+    opf_name: str,
     md,
     items_by_href,
     spine_hrefs,
@@ -148,12 +214,12 @@ def build_new_epub(
     min_w: int = 2,
     min_h: int = 2,
 ):
-    newroot = Path(tempfile.mkdtemp(prefix="epubbuild_"))
+    # Kein Staging-Verzeichnis mehr: das Output-EPUB wird direkt assembliert,
+    # jedes Byte wandert genau einmal Quell-ZIP -> Ziel-ZIP.
+    z = zipfile.ZipFile(out_path, "w")
     try:
-        (newroot / "META-INF").mkdir(parents=True, exist_ok=True)
-        (newroot / "OEBPS" / "Text").mkdir(parents=True, exist_ok=True)
-        (newroot / "OEBPS" / "Images").mkdir(parents=True, exist_ok=True)
-        (newroot / "OEBPS" / "Styles").mkdir(parents=True, exist_ok=True)
+        # mimetype muss der erste Eintrag sein & unkomprimiert
+        z.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
 
         container_xml = f'''<?xml version="1.0" encoding="UTF-8"?>
 <container version="1.0" xmlns="{CONTAINER_NS}">
@@ -161,41 +227,83 @@ def build_new_epub(
     <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
   </rootfiles>
 </container>'''
-        (newroot / "META-INF" / "container.xml").write_text(container_xml, encoding="utf-8")
+        _write_entry(z, "META-INF/container.xml", container_xml)
+
+        opf_dir = posixpath.dirname(opf_name)
+        entries = zip_entries(zf)
 
-        opf_dir = opf_path.parent
+        def resolve_href(href: str, base_dir: str):
+            """Href relativ zu base_dir auf einen ZIP-Eintrag abbilden."""
+            name = posixpath.normpath(posixpath.join(base_dir, href))
+            if name in entries:
+                return name
+            alt = posixpath.normpath(posixpath.join(opf_dir, href))
+            return alt if alt in entries else None
 
         css_files = []
         for href, it in items_by_href.items():
             if it["media-type"] == "text/css":
-                src = (opf_dir / href).resolve()
-                if src.exists():
-                    dst = newroot / "OEBPS" / "Styles" / Path(href).name
-                    dst.write_bytes(src.read_bytes())
+                entry = resolve_href(href, opf_dir)
+                if entry is not None:
+                    _copy_member(zf, entries[entry], z, "OEBPS/Styles/" + Path(href).name)
                     css_files.append("Styles/" + Path(href).name)
         css_links_html = "\n".join(
             f'  <link rel="stylesheet" type="text/css" href="../{css}"/>' for css in css_files
         )
 
+        # Templates einmal pro Buch um die css_links ergänzen und an den
+        # Platzhaltern vorzerlegen -> pro Seite nur noch Konkatenation statt
+        # str.format (zählt bei Büchern mit tausenden Bildseiten)
+        _img_tpl = PAGE_TEMPLATE.replace("{css_links}", css_links_html)
+        img_head, _rest = _img_tpl.split("{title}")
+        img_mid1, _rest = _rest.split("{img_href}")
+        img_mid2, img_tail = _rest.split("{alt}")
+        _txt_tpl = TEXT_PAGE_TEMPLATE.replace("{css_links}", css_links_html)
+        txt_head, _rest = _txt_tpl.split("{title}")
+        txt_mid, txt_tail = _rest.split("{content}")
+
         img_manifest, page_manifest, navpoints = [], [], []
         img_id_counter, page_id_counter, text_seq_counter = 1, 1, 1
-        copied_images = {}
+        copied_images = {}   # Eintragsname -> Dateiname im Output
+        hashed_images = {}   # Inhalts-Digest -> Dateiname im Output
 
-        def copy_image(src_path: Path):
+        def copy_image(entry_name: str):
             nonlocal img_id_counter
-            try:
-                with Image.open(src_path) as im:
-                    w, h = im.size
-                if w < min_w or h < min_h:
-                    print(f"    [skip] Platzhalter-Bild ignoriert ({w}x{h}): {src_path.name}")
-                    return None
-            except (UnidentifiedImageError, OSError):
-                pass
-            name = f"img{img_id_counter:04d}{src_path.suffix.lower()}"
+            info = entries[entry_name]
+            # Größen-Vorfilter: winzige Platzhalter sind praktisch immer
+            # < 512 Bytes (file_size steht gratis im Central Directory).
+            # Bei den Default-Schwellen (2x2) entfällt für echte
+            # Illustrationen damit jedes Header-Parsing; wer höhere
+            # Schwellen setzt, bekommt weiterhin den vollen Check.
+            if info.file_size < 512 or min_w > 2 or min_h > 2:
+                with zf.open(info) as f:
+                    head = f.read(4096)
+                dims = _read_dims(head)
+                if dims is None:
+                    # unbekanntes Format -> Pillow als Fallback
+                    try:
+                        with zf.open(info) as f, Image.open(f) as im:
+                            dims = im.size
+                    except (UnidentifiedImageError, OSError):
+                        dims = None
+                if dims is not None:
+                    w, h = dims
+                    if w < min_w or h < min_h:
+                        print(f"    [skip] Platzhalter-Bild ignoriert ({w}x{h}): {posixpath.basename(entry_name)}")
+                        return None
+            # Inhalt einmal lesen und hashen: dieselben Bytes unter anderem
+            # Href (z.B. Cover nochmal als erste Seite) werden nur einmal
+            # übernommen. Ein ZIP-Eintrag lässt sich nicht zurücknehmen,
+            # daher muss der Digest vor dem Schreiben feststehen.
+            data = zf.read(info)
+            digest = hashlib.blake2b(data, digest_size=16).digest()
+            if digest in hashed_images:
+                return hashed_images[digest]
+            name = f"img{img_id_counter:04d}{Path(entry_name).suffix.lower()}"
+            _write_entry(z, f"OEBPS/Images/{name}", data)
             img_id_counter += 1
-            dest = newroot / "OEBPS" / "Images" / name
-            dest.write_bytes(src_path.read_bytes())
-            img_manifest.append((f"img{img_id_counter}", f"Images/{name}", guess_mime(dest)))
+            hashed_images[digest] = name
+            img_manifest.append((f"img{img_id_counter}", f"Images/{name}", guess_mime(Path(name))))
             return name
 
         def write_image_page(newname: str, alt_text: str):
@@ -203,8 +311,8 @@ def build_new_epub(
             title = Path(newname).stem
             page_name = f"imgpage{page_id_counter:04d}.xhtml"
             page_id_counter += 1
-            content = PAGE_TEMPLATE.format(title=title, img_href=newname, alt=alt_text, css_links=css_links_html)
-            (newroot / "OEBPS" / "Text" / page_name).write_text(content, encoding="utf-8")
+            content = img_head + title + img_mid1 + newname + img_mid2 + alt_text + img_tail
+            _write_entry(z, f"OEBPS/Text/{page_name}", content)
             page_manifest.append((Path(page_name).stem, f"Text/{page_name}", "application/xhtml+xml"))
             navpoints.append((title, f"Text/{page_name}"))
 
@@ -218,35 +326,62 @@ def build_new_epub(
             text_seq_counter += 1
             page_name = f"textpage{page_id_counter:04d}.xhtml"
             page_id_counter += 1
-            content = TEXT_PAGE_TEMPLATE.format(title=title, content=fragment_html, css_links=css_links_html)
-            (newroot / "OEBPS" / "Text" / page_name).write_text(content, encoding="utf-8")
+            content = txt_head + title + txt_mid + fragment_html + txt_tail
+            _write_entry(z, f"OEBPS/Text/{page_name}", content)
             page_manifest.append((Path(page_name).stem, f"Text/{page_name}", "application/xhtml+xml"))
             navpoints.append((title, f"Text/{page_name}"))
 
         def extract_text_fragment(nodes):
-            frag = BeautifulSoup("<div></div>", "lxml")
-            root = frag.div
+            # nodes sind disjunkte Geschwister-Elemente oder lose Textstücke
+            # (text/tail an Bildgrenzen) -> ein Durchlauf, kein erneutes
+            # Parsen pro Knoten
+            root = etree.Element("div")
+            last = None
             for node in nodes:
-                if getattr(node, "name", None) in ("img", "script", "style"):
+                if isinstance(node, str):
+                    if last is None:
+                        root.text = (root.text or "") + node
+                    else:
+                        last.tail = (last.tail or "") + node
                     continue
-                clone = BeautifulSoup(str(node), "lxml")
-                for im in clone.find_all("img"):
-                    im.decompose()
-                if clone.get_text(strip=True):
+                if node.tag in ("img", "script", "style"):
+                    continue
+                clone = copy.deepcopy(node)
+                clone.tail = None
+                etree.strip_elements(clone, "img", "script", "style", with_tail=False)
+                if clone.text_content().strip():
                     root.append(clone)
-            return "".join(str(c) for c in root.children)
+                    last = clone
+            # method="xml", damit Void-Elemente wie <br/> geschlossen bleiben
+            # – die Textseiten sind als application/xhtml+xml deklariert
+            serialized = etree.tostring(root, method="xml", encoding="unicode")
+            if serialized == "<div/>":
+                return ""
+            return serialized[len("<div>"):-len("</div>")]
 
         html_candidates = [h for h in spine_hrefs if h and h.lower().endswith((".xhtml", ".html", ".htm"))]
         if not html_candidates:
             html_candidates = [href for href, it in items_by_href.items()
                                if it["media-type"] in ("application/xhtml+xml", "text/html")]
 
+        # Ein Parser für alle Spine-Dokumente; die Rohbytes gehen direkt an
+        # libxml2, ohne Umweg über einen Python-str (EPUB-XHTML ist UTF-8)
+        html_parser = lhtml.HTMLParser(encoding="utf-8", recover=True)
+
         for html_href in html_candidates:
-            original_html = (opf_dir / html_href).resolve()
-            if not original_html.exists():
+            html_entry = resolve_href(html_href, opf_dir)
+            if html_entry is None:
                 continue
-            soup = BeautifulSoup(original_html.read_text(encoding="utf-8", errors="ignore"), "lxml")
-            body = soup.body or soup
+            html_dir = posixpath.dirname(html_entry)
+            try:
+                doc = lhtml.fromstring(zf.read(entries[html_entry]), parser=html_parser)
+            except etree.ParserError:
+                # leeres/kaputtes Spine-Dokument überspringen statt das
+                # ganze Buch abzubrechen
+                continue
+            body = doc.find("body")
+            if body is None:
+                body = doc
             base_title = Path(html_href).stem
 
             pending_text_nodes = []
@@ -258,31 +393,51 @@ def build_new_epub(
                     write_text_page(fragment_html, base_title)
                     pending_text_nodes = []
 
-            for node in body.descendants:
-                if getattr(node, "name", None) == "img":
-                    flush_text()
-                    src = node.get("src")
-                    if not src:
-                        continue
-                    src_path = (original_html.parent / src).resolve()
-                    if not src_path.exists():
-                        alt_try = (opf_dir / src).resolve()
-                        if alt_try.exists():
-                            src_path = alt_try
-                        else:
-                            continue
-                    key = str(src_path)
-                    if key not in copied_images:
-                        newname = copy_image(src_path)
-                        if not newname:
-                            continue
-                        copied_images[key] = newname
-                    else:
-                        newname = copied_images[key]
-                    alt_text = node.get("alt") or Path(newname).stem
-                    write_image_page(newname, alt_text)
+            def handle_image(node):
+                src = node.get("src")
+                if not src:
+                    return
+                entry = resolve_href(src, html_dir)
+                if entry is None:
+                    return
+                if entry not in copied_images:
+                    newname = copy_image(entry)
+                    if not newname:
+                        return
+                    copied_images[entry] = newname
                 else:
+                    newname = copied_images[entry]
+                alt_text = node.get("alt") or Path(newname).stem
+                write_image_page(newname, alt_text)
+
+            # iterwalk läuft in C; skip_subtree() ersetzt die frühere
+            # Python-Rekursion: in einen Teilbaum steigen wir nur ab, wenn er
+            # eine <img>-Grenze enthält, sonst wird er als Block gesammelt.
+            # Loser Text (text/tail) wird explizit mitakkumuliert, damit an
+            # Bildgrenzen nichts verloren geht.
+            walker = etree.iterwalk(body, events=("start", "end"))
+            for ev, node in walker:
+                if ev == "end":
+                    if node is not body and node.tail and node.tail.strip():
+                        pending_text_nodes.append(node.tail)
+                    continue
+                if node is body:
+                    if node.text and node.text.strip():
+                        pending_text_nodes.append(node.text)
+                    continue
+                if not isinstance(node.tag, str):
+                    continue
+                if node.tag == "img":
+                    flush_text()
+                    handle_image(node)
+                    walker.skip_subtree()
+                elif node.find(".//img") is None:
                     pending_text_nodes.append(node)
+                    walker.skip_subtree()
+                elif node.text and node.text.strip():
+                    # Container mit Bildgrenze: weiter absteigen, losen
+                    # Text am Anfang mitnehmen
+                    pending_text_nodes.append(node.text)
             flush_text()
 
         if not page_manifest:
@@ -293,85 +448,90 @@ def build_new_epub(
         existing_identifier = next((v for k, v in md["dc"] if k == "identifier" and v), None)
         book_uid = existing_identifier or f"urn:uuid:{uuid4()}"
 
-        # toc.ncx
-        ncx_path = newroot / "OEBPS" / "toc.ncx"
-        ncx_root = etree.Element(f"{{{NCX_NS}}}ncx", nsmap={None: NCX_NS})
-        ncx_root.set("version", "2005-1")
-        head = etree.SubElement(ncx_root, f"{{{NCX_NS}}}head")
-        etree.SubElement(head, f"{{{NCX_NS}}}meta", name="dtb:uid", content=book_uid)  # <-- konsistent!
-        etree.SubElement(head, f"{{{NCX_NS}}}meta", name="dtb:depth", content="1")
-        doctitle = etree.SubElement(ncx_root, f"{{{NCX_NS}}}docTitle")
-        etree.SubElement(doctitle, f"{{{NCX_NS}}}text").text = next((v for k, v in md["dc"] if k == "title"), "Bilder")
-        navmap = etree.SubElement(ncx_root, f"{{{NCX_NS}}}navMap")
+        # toc.ncx – festes Schema, daher direkt als String zusammensetzen
+        # statt pro navPoint drei lxml-Elemente zu allozieren. Ohne
+        # Einrückung: kein Reader braucht sie, sie bläht nur auf.
+        ncx_title = next((v for k, v in md["dc"] if k == "title"), "Bilder")
+        ncx_parts = [
+            '<?xml version="1.0" encoding="utf-8"?>\n',
+            f'<ncx xmlns="{NCX_NS}" version="2005-1">',
+            f'<head><meta name="dtb:uid" content={quoteattr(book_uid)}/>',  # <-- konsistent!
+            '<meta name="dtb:depth" content="1"/></head>',
+            f'<docTitle><text>{escape(ncx_title)}</text></docTitle>',
+            '<navMap>',
+        ]
         for i, (label, src) in enumerate(navpoints, 1):
-            np = etree.SubElement(navmap, f"{{{NCX_NS}}}navPoint", id=f"np{i}", playOrder=str(i))
-            navlabel = etree.SubElement(np, f"{{{NCX_NS}}}navLabel")
-            etree.SubElement(navlabel, f"{{{NCX_NS}}}text").text = label
-            etree.SubElement(np, f"{{{NCX_NS}}}content", src=src)
-        ncx_path.write_bytes(etree.tostring(ncx_root, encoding="utf-8", xml_declaration=True, pretty_print=True))
-
-        # content.opf
-        opf_new = newroot / "OEBPS" / "content.opf"
-        pkg = etree.Element(f"{{{OPF_NS}}}package", nsmap={None: OPF_NS, "dc": DC_NS})
-        pkg.set("version", "2.0")
-        pkg.set("unique-identifier", "BookId")  # <-- verweist auf dc:identifier mit id=BookId
-
-        meta_el = etree.SubElement(pkg, f"{{{OPF_NS}}}metadata")
-        # vorhandene dc:* übernehmen
+            ncx_parts.append(
+                f'<navPoint id="np{i}" playOrder="{i}">'
+                f'<navLabel><text>{escape(label)}</text></navLabel>'
+                f'<content src={quoteattr(src)}/></navPoint>'
+            )
+        ncx_parts.append('</navMap></ncx>')
+        _write_entry(z, "OEBPS/toc.ncx", "".join(ncx_parts))
+
+        # content.opf – ebenfalls als String-Liste
+        opf_parts = [
+            '<?xml version="1.0" encoding="utf-8"?>\n',
+            # unique-identifier verweist auf dc:identifier mit id=BookId
+            f'<package xmlns="{OPF_NS}" xmlns:dc="{DC_NS}" version="2.0" unique-identifier="BookId">',
+            '<metadata>',
+        ]
+        # vorhandene dc:* übernehmen; identifier nicht duplizieren,
+        # der "kanonische" kommt gleich
         for k, v in md["dc"]:
-            if not v:
-                continue
-            # wir duplizieren identifier nicht; der "kanonische" kommt gleich
-            if k == "identifier":
+            if not v or k == "identifier":
                 continue
-            el = etree.SubElement(meta_el, f"{{{DC_NS}}}{k}")
-            el.text = v
-        # kanonischen Identifier einfügen
-        id_el = etree.SubElement(meta_el, f"{{{DC_NS}}}identifier", id="BookId")
-        id_el.text = book_uid
+            opf_parts.append(f'<dc:{k}>{escape(v)}</dc:{k}>')
+        opf_parts.append(f'<dc:identifier id="BookId">{escape(book_uid)}</dc:identifier>')
         # einfache <meta>-Einträge übernehmen
         for name, content in md["meta"]:
             if name and content:
-                etree.SubElement(meta_el, f"{{{OPF_NS}}}meta", name=name, content=content)
+                opf_parts.append(f'<meta name={quoteattr(name)} content={quoteattr(content)}/>')
+        opf_parts.append('</metadata><manifest>')
 
-        manifest_el = etree.SubElement(pkg, f"{{{OPF_NS}}}manifest")
-        etree.SubElement(manifest_el, f"{{{OPF_NS}}}item", id="ncx", href="toc.ncx", **{"media-type": "application/x-dtbncx+xml"})
+        def item_line(iid, href, mt):
+            return f'<item id={quoteattr(iid)} href={quoteattr(href)} media-type={quoteattr(mt)}/>'
+
+        opf_parts.append(item_line("ncx", "toc.ncx", "application/x-dtbncx+xml"))
         for css in css_files:
-            etree.SubElement(manifest_el, f"{{{OPF_NS}}}item", id=slugify(Path(css).stem), href=css, **{"media-type": "text/css"})
+            opf_parts.append(item_line(slugify(Path(css).stem), css, "text/css"))
         for pid, href, mt in page_manifest:
-            etree.SubElement(manifest_el, f"{{{OPF_NS}}}item", id=pid, href=href, **{"media-type": mt})
+            opf_parts.append(item_line(pid, href, mt))
         for iid, href, mt in img_manifest:
-            etree.SubElement(manifest_el, f"{{{OPF_NS}}}item", id=slugify(iid), href=href, **{"media-type": mt})
-
-        spine_el = etree.SubElement(pkg, f"{{{OPF_NS}}}spine", toc="ncx")
+            opf_parts.append(item_line(slugify(iid), href, mt))
+        opf_parts.append('</manifest><spine toc="ncx">')
         for pid, href, mt in page_manifest:
-            etree.SubElement(spine_el, f"{{{OPF_NS}}}itemref", idref=pid)
-
-        opf_new.write_bytes(etree.tostring(pkg, encoding="utf-8", xml_declaration=True, pretty_print=True))
-
-        # EPUB packen: mimetype zuerst & unkomprimiert
-        with zipfile.ZipFile(out_path, "w") as z:
-            z.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
-            for base, _, files in os.walk(newroot):
-                for fn in files:
-                    rel = os.path.relpath(os.path.join(base, fn), newroot)
-                    if rel == "mimetype":
-                        continue
-                    z.write(os.path.join(base, fn), rel)
-    finally:
-        shutil.rmtree(newroot, ignore_errors=True)
+            opf_parts.append(f'<itemref idref={quoteattr(pid)}/>')
+        opf_parts.append('</spine></package>')
+        _write_entry(z, "OEBPS/content.opf", "".join(opf_parts))
+
+        z.close()
+    except BaseException:
+        # halbfertiges Output-EPUB nicht liegen lassen
+        z.close()
+        out_path.unlink(missing_ok=True)
+        raise
 
 def process_one(epub_file: Path, out_dir: Path, **kwargs):
     base = epub_file.stem
     out_path = out_dir / f"{base}_imgsplit.epub"
-    with tempfile.TemporaryDirectory(prefix="epubwork_") as tmp:
-        tmpdir = Path(tmp)
-        unzip_epub(epub_file, tmpdir)
-        opf_path = find_opf(tmpdir)
-        md, items_by_id, items_by_href, spine_hrefs = parse_opf(opf_path)
-        build_new_epub(tmpdir, opf_path, md, items_by_href, spine_hrefs, out_path, **kwargs)
+    with open_epub(epub_file) as zf:
+        opf_name = find_opf(zf)
+        md, items_by_id, items_by_href, spine_hrefs = parse_opf(zf, opf_name)
+        build_new_epub(zf, opf_name, md, items_by_href, spine_hrefs, out_path, **kwargs)
     return out_path
 
+def _process_one_safe(epub_file: Path, out_dir: Path, **kwargs):
+    """Worker-Wrapper: fängt Fehler pro EPUB ab, damit der Pool weiterläuft."""
+    try:
+        print(f"[+] Verarbeite: {epub_file.name}")
+        outp = process_one(epub_file, out_dir, **kwargs)
+        print(f"    -> {outp.name}")
+        return True
+    except Exception as e:
+        print(f"[!] Fehler bei {epub_file.name}: {e}")
+        return False
+
 def main():
     ap = argparse.ArgumentParser(description="EPUB -> Bildseiten + (optional) Textseiten dazwischen, inkl. CSS-Übernahme.")
     ap.add_argument("--input", "-i", required=True, help="Input-Verzeichnis mit .epub")
@@ -385,27 +545,28 @@ def main():
     out_dir = Path(args.output).expanduser().resolve()
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    epubs = sorted(in_dir.glob("*.epub"))
+    epubs = []
+    if in_dir.is_dir():
+        epubs = sorted(Path(e.path) for e in os.scandir(in_dir)
+                       if e.is_file() and e.name.lower().endswith(".epub"))
     if not epubs:
         print(f"Keine EPUBs in {in_dir}")
         return
 
-    ok, fail = 0, 0
-    for f in epubs:
-        try:
-            print(f"[+] Verarbeite: {f.name}")
-            outp = process_one(
-                f,
-                out_dir,
-                images_only=args.images_only,
-                min_w=args.min_width,
-                min_h=args.min_height,
-            )
-            print(f"    -> {outp.name}")
-            ok += 1
-        except Exception as e:
-            print(f"[!] Fehler bei {f.name}: {e}")
-            fail += 1
+    # Jedes EPUB wird unabhängig aus seinem eigenen Quell-Archiv verarbeitet
+    # (kein geteilter Zustand), daher parallel über einen Prozess-Pool
+    # abarbeiten.
+    worker = functools.partial(
+        _process_one_safe,
+        out_dir=out_dir,
+        images_only=args.images_only,
+        min_w=args.min_width,
+        min_h=args.min_height,
+    )
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = list(executor.map(worker, epubs))
+    ok = sum(results)
+    fail = len(results) - ok
     print(f"Fertig. Erfolgreich: {ok}, Fehlgeschlagen: {fail}")
 
 if __name__ == "__main__":